@@ -11,22 +11,44 @@ Description:
     
 Dependencies:
     - Python 3.x
-    - bitarray: pip install bitarray
     - graphviz: pip install graphviz
-    - pickle (estándar)
+    - numpy: pip install numpy
+    - numba (opcional): pip install numba
+    - struct (estándar)
 ===============================================================
 """
 
 import heapq
-import pickle
-from bitarray import bitarray
-from collections import Counter
+import struct
 import os
 from graphviz import Digraph
 import time
 import csv
 import statistics
-import glob
+import mmap
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+# Caracteres que se codifican por bloque en pack_bits
+ENCODE_BLOCK = 1 << 16
+# Longitud máxima de código que cabe en el acumulador de 64 bits de Numba
+NUMBA_MAX_CODE_LEN = 56
+# Bits que resuelve de golpe la tabla rápida de decode_file_inverse: un byte
+# (256 entradas) cubre los códigos de casi todos los caracteres de un texto;
+# los códigos más largos se resuelven con las tablas canónicas
+LUT_BITS = 8
+# Transiciones que memoiza como máximo la máquina de estados de decode_fsm
+FSM_CACHE_LIMIT = 1 << 14
+# Identificador y versión del formato .huff (header canónico)
+HUFF_MAGIC = b'HUF'
+HUFF_VERSION = 1
 
 # Class to represent huffman tree
 
@@ -41,86 +63,200 @@ class Node:
     def __lt__(self, other):
         return self.data < other.data
 
-    def __str__(self, level=0, prefix="Root: ", cumchain=""):
+    def __str__(self):
         """Devuelve una representación jerárquica del árbol."""
-        result = "   " * level + \
-            f"{prefix}({self.char}:{self.data}):{cumchain}\n"
-        if self.left:
-            result += self.left.__str__(level + 1,
-                                        prefix="L-0- ", cumchain=cumchain+'0')
-        if self.right:
-            result += self.right.__str__(level + 1,
-                                         prefix="R-1- ", cumchain=cumchain+'1')
-        return result
+        lines = []
+        stack = [(self, 0, "Root: ", "")]
+        while stack:
+            node, level, prefix, cumchain = stack.pop()
+            lines.append("   " * level +
+                         f"{prefix}({node.char}:{node.data}):{cumchain}\n")
+            # Se apila primero la derecha para visitar antes la izquierda
+            if node.right:
+                stack.append((node.right, level + 1, "R-1- ", cumchain + '1'))
+            if node.left:
+                stack.append((node.left, level + 1, "L-0- ", cumchain + '0'))
+        return ''.join(lines)
 
 # Function to traverse tree in preorder
-# manner and push the huffman representation
-# of each character.
+# manner and collect the code length
+# (depth) of each character.
+# The tree is stored as parallel arrays
+# indexed by node id (-1 means no child).
 
 
-def preOrder(root, ans, curr):
-    if root is None:
-        return
+def code_lengths(left, right, chars, root):
+    lengths = {}
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
 
-    # Leaf node represents a character.
-    if root.left is None and root.right is None:
-        ans[root.char] = curr
-        return
+        # Leaf node represents a character.
+        if left[node] < 0:
+            lengths[chars[node]] = depth
+            continue
 
-    preOrder(root.left, ans, curr + '0')
-    preOrder(root.right, ans, curr + '1')
+        stack.append((right[node], depth + 1))
+        stack.append((left[node], depth + 1))
+    return lengths
 
 
 def huffmanCodes(s, freq):
     # Code here
     n = len(s)
 
-    # Min heap for node class.
-    pq = []
-    for i in range(n):
-        tmp = Node(freq[i], s[i])
-        heapq.heappush(pq, tmp)
+    # Huffman tree as parallel arrays (SoA).
+    data = list(freq)
+    chars = list(s)
+    left = [-1] * n
+    right = [-1] * n
+
+    # Min heap of (frequency, node id); the id breaks ties.
+    pq = [(freq[i], i) for i in range(n)]
+    heapq.heapify(pq)
 
     # Caso especial: un solo carácter
     if len(pq) == 1:
-        root = heapq.heappop(pq)
-        codes_dic = {root.char: '0'}
-        return codes_dic, root
+        return {s[0]: (0, 1)}
 
     # Construct huffman tree.
     while len(pq) >= 2:
         # Left node
-        l = heapq.heappop(pq)
+        l_freq, l = heapq.heappop(pq)
 
         # Right node
-        r = heapq.heappop(pq)
+        r_freq, r = heapq.heappop(pq)
+
+        k = len(data)
+        data.append(l_freq + r_freq)
+        left.append(l)
+        right.append(r)
+        chars.append(None)
+
+        heapq.heappush(pq, (data[k], k))
+
+    # Only the depths are taken from the tree; codes are canonical.
+    root = pq[0][1]
+    return build_canonical_codes(code_lengths(left, right, chars, root))
+
+
+def build_canonical_codes(lengths):
+    """Asigna códigos canónicos (código, longitud) a partir de las longitudes."""
+    items = sorted(lengths.items(), key=lambda x: (x[1], x[0]))
+    canon = {}
+    code = 0
+    prev_len = items[0][1]
+    for char, length in items:
+        code <<= length - prev_len
+        prev_len = length
+        canon[char] = (code, length)
+        code += 1
+    return canon
+
+
+def code_to_str(code, length):
+    """Representación en texto ('0101') de un código entero."""
+    return format(code, f'0{length}b')
+
+
+def build_canonical_tables(codes_dic):
+    """Construye las tablas del decodificador de Moffat–Turpin."""
+    max_len = max(length for _, length in codes_dic.values())
+    count = [0] * (max_len + 1)
+    for _, length in codes_dic.values():
+        count[length] += 1
+
+    first_code = [0] * (max_len + 1)
+    offset = [0] * (max_len + 1)
+    sentinel = [0] * (max_len + 1)
+    code = 0
+    index = 0
+    for length in range(1, max_len + 1):
+        first_code[length] = code
+        offset[length] = index
+        # Primer valor (alineado a max_len bits) que ya no tiene esta longitud
+        sentinel[length] = (code + count[length]) << (max_len - length)
+        index += count[length]
+        code = (code + count[length]) << 1
+
+    symbols = [char for char, _ in sorted(codes_dic.items(),
+                                          key=lambda x: (x[1][1], x[0]))]
+    return {
+        'max_len': max_len,
+        'count': count,
+        'first_code': first_code,
+        'offset': offset,
+        'sentinel': sentinel,
+        'symbols': symbols,
+        # Bytes UTF-8 de cada símbolo, calculados una sola vez para los decodificadores
+        'sym_bytes': [char.encode('utf-8') for char in symbols]
+    }
+
 
-        newNode = Node(l.data + r.data)
-        newNode.left = l
-        newNode.right = r
+def canonical_entries(tables):
+    """Recorre (índice del símbolo, código, longitud) en orden canónico."""
+    for length in range(1, tables['max_len'] + 1):
+        first = tables['first_code'][length]
+        offset = tables['offset'][length]
+        for i in range(tables['count'][length]):
+            yield offset + i, first + i, length
 
-        heapq.heappush(pq, newNode)
 
-    root = heapq.heappop(pq)
-    codes_dic = {}
-    preOrder(root, codes_dic, "")
-    return codes_dic, root
+def build_decode_lut(tables, lut_bits=LUT_BITS):
+    """Tabla de 2^lut_bits entradas: ventana de bits -> (bytes UTF-8, longitud).
+
+    Los códigos más largos que lut_bits quedan como (None, 0) y se
+    resuelven con las tablas canónicas.
+    """
+    sym_bytes = tables['sym_bytes']
+    lut = [(None, 0)] * (1 << lut_bits)
+    for index, code, length in canonical_entries(tables):
+        if length <= lut_bits:
+            span = 1 << (lut_bits - length)
+            start = code * span
+            lut[start:start + span] = [(sym_bytes[index], length)] * span
+    return lut
+
+
+def build_tree_from_codes(codes_dic, freq_dict=None):
+    """Reconstruye el árbol de Huffman a partir de los códigos."""
+    root = Node(0)
+    for char, (code, length) in codes_dic.items():
+        freq = freq_dict.get(char, 0) if freq_dict else 0
+        node = root
+        node.data += freq
+        for shift in range(length - 1, -1, -1):
+            if not (code >> shift) & 1:
+                if node.left is None:
+                    node.left = Node(0)
+                node = node.left
+            else:
+                if node.right is None:
+                    node.right = Node(0)
+                node = node.right
+            node.data += freq
+        node.char = char
+    return root
 
 
 def generate_frequency_stats(text):
     """Genera estadísticas de frecuencia de caracteres en el texto."""
-    freq_dict = Counter(text)
-    characters = list(freq_dict.keys())
-    frequencies = list(freq_dict.values())
+    # Histograma vectorizado sobre los code points del texto
+    code_points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    counts = np.bincount(code_points)
+    present = counts.nonzero()[0]
+    characters = [chr(c) for c in present.tolist()]
+    frequencies = counts[present].tolist()
+    freq_dict = dict(zip(characters, frequencies))
     return characters, frequencies, freq_dict
 
 
 def calculate_average_bits(codes_dic, freq_dict, total_chars):
     """Calcula el número promedio de bits por símbolo."""
     total_bits = 0
-    for char, code in codes_dic.items():
+    for char, (_, length) in codes_dic.items():
         freq = freq_dict.get(char, 0)
-        total_bits += len(code) * freq
+        total_bits += length * freq
     avg_bits = total_bits / total_chars if total_chars > 0 else 0
     return avg_bits
 
@@ -132,11 +268,11 @@ def print_huffman_table(codes_dic, freq_dict):
     print("="*60)
     print(f"{'Carácter':<15} {'Frecuencia':<15} {'Código':<20}")
     print("-"*60)
-    sorted_items = sorted(codes_dic.items(), key=lambda x: (len(x[1]), x[0]))
+    sorted_items = sorted(codes_dic.items(), key=lambda x: (x[1][1], x[0]))
     for char, code in sorted_items:
         char_repr = repr(char) if char in ['\n', '\t', ' '] else char
         freq = freq_dict.get(char, 0)
-        print(f"{char_repr:<15} {freq:<15} {code:<20}")
+        print(f"{char_repr:<15} {freq:<15} {code_to_str(*code):<20}")
     print("="*60)
 
 
@@ -185,15 +321,100 @@ def visualize_huffman_tree(root, output_file="huffman_tree"):
         print(f"Código DOT guardado como: {output_file}.dot")
 
 
-def encode_file(input_filename, output_filename=None):
+def build_code_table(codes_dic):
+    """Construye la tabla de traducción ord(c) -> código de Huffman.
+
+    Es una lista indexada por ord(c) en lugar de un diccionario, para que
+    str.translate resuelva cada carácter con un acceso por índice.
+    """
+    code_table = [None] * (max(ord(c) for c in codes_dic) + 1)
+    for c, code in codes_dic.items():
+        code_table[ord(c)] = code_to_str(*code)
+    return code_table
+
+
+def pack_bits(text, code_table, total_bits, block_size=ENCODE_BLOCK):
+    """Codifica el texto por bloques y empaqueta los bits en un bytearray."""
+    out = bytearray((total_bits + 7) // 8)
+    pos = 0
+    pending = ""
+    for start in range(0, len(text), block_size):
+        chunk = pending + text[start:start + block_size].translate(code_table)
+        # Volcar todos los bytes completos del bloque de una sola vez
+        nbytes = len(chunk) // 8
+        if nbytes:
+            out[pos:pos + nbytes] = int(chunk[:nbytes * 8], 2).to_bytes(nbytes, 'big')
+            pos += nbytes
+        pending = chunk[nbytes * 8:]
+    # Último byte incompleto, alineado a la izquierda
+    if pending:
+        out[pos] = int(pending.ljust(8, '0'), 2)
+    return out
+
+
+if HAVE_NUMBA:
+    @njit(cache=True)
+    def huff_encode(symbols, code_int, code_len, out):
+        """Empaqueta los códigos de los símbolos en out; devuelve el total de bits."""
+        acc = np.uint64(0)
+        nbits = 0
+        total = 0
+        pos = 0
+        for i in range(symbols.shape[0]):
+            s = symbols[i]
+            length = code_len[s]
+            acc = (acc << np.uint64(length)) | code_int[s]
+            nbits += length
+            total += length
+            while nbits >= 8:
+                nbits -= 8
+                out[pos] = np.uint8((acc >> np.uint64(nbits)) & np.uint64(0xFF))
+                pos += 1
+        if nbits > 0:
+            out[pos] = np.uint8((acc << np.uint64(8 - nbits)) & np.uint64(0xFF))
+        return total
+
+
+def pack_bits_numba(text, codes_dic, total_bits):
+    """Versión compilada de pack_bits sobre los code points del texto."""
+    max_ord = max(ord(c) for c in codes_dic)
+    code_int = np.zeros(max_ord + 1, dtype=np.uint64)
+    code_len = np.zeros(max_ord + 1, dtype=np.uint8)
+    for c, (code, length) in codes_dic.items():
+        code_int[ord(c)] = code
+        code_len[ord(c)] = length
+    symbols = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    out = np.empty((total_bits + 7) // 8, dtype=np.uint8)
+    huff_encode(symbols, code_int, code_len, out)
+    return out
+
+
+def print_compression_stats(output_filename, stats):
+    """Imprime el resumen de compresión de un archivo."""
+    print(f"\nArchivo comprimido: {output_filename}")
+    print(f"  Tamaño original: {stats['original_size']} bytes")
+    print(f"  Tamaño comprimido: {stats['compressed_size']} bytes")
+    print(f"  Factor de compresión: {stats['compression_factor']:.4f}")
+    print(f"  Bits promedio por símbolo: {stats['avg_bits_per_symbol']:.4f}")
+
+
+def encode_file(input_filename, output_filename=None, verbose=True):
     """Comprime un archivo de texto usando el algoritmo de Huffman."""
     if output_filename is None:
         output_filename = input_filename + ".huff"
 
-    # Leer archivo original
+    # Leer archivo original (mapeado en memoria, sin copia intermedia en bytes)
     try:
-        with open(input_filename, 'r', encoding='utf-8') as f:
-            text = f.read()
+        with open(input_filename, 'rb') as f:
+            original_size = os.fstat(f.fileno()).st_size
+            if original_size == 0:
+                text = ""
+            else:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    text = str(mm, 'utf-8')
+                finally:
+                    mm.close()
     except Exception as e:
         print(f"Error al leer archivo: {e}")
         return None
@@ -205,38 +426,30 @@ def encode_file(input_filename, output_filename=None):
     # Generar estadísticas
     characters, frequencies, freq_dict = generate_frequency_stats(text)
 
-    # Construir árbol y códigos
-    codes_dic, root = huffmanCodes(characters, frequencies)
-
-    # Crear códigos como bitarray
-    codes = {}
-    for c in codes_dic:
-        codes[c] = bitarray(codes_dic[c])
+    # Construir árbol y códigos canónicos (código, longitud)
+    codes_dic = huffmanCodes(characters, frequencies)
 
-    # Codificar el texto
-    encoded_bits = bitarray()
-    for char in text:
-        encoded_bits.extend(codes[char])
+    # Codificar el texto directamente a bytes empaquetados
+    total_bits = sum(length * freq_dict[c] for c, (_, length) in codes_dic.items())
+    max_len = max(length for _, length in codes_dic.values())
+    if HAVE_NUMBA and max_len <= NUMBA_MAX_CODE_LEN:
+        packed = pack_bits_numba(text, codes_dic, total_bits)
+    else:
+        packed = pack_bits(text, build_code_table(codes_dic), total_bits)
 
-    # Calcular padding
-    padding = (8 - len(encoded_bits) % 8) % 8
-    encoded_bits.extend([0] * padding)
+    # Calcular padding (el último byte ya viene relleno con ceros)
+    padding = (8 - total_bits % 8) % 8
 
     # Guardar archivo comprimido
+    header_bytes = pack_header(codes_dic, padding, len(text))
     with open(output_filename, 'wb') as f:
-        # Header con pickle: diccionario de códigos, padding y árbol
-        header = {
-            'codes_dic': codes_dic,
-            'padding': padding,
-            'tree': root
-        }
-        pickle.dump(header, f)
+        # Header canónico: solo longitudes de código, sin pickle
+        f.write(header_bytes)
         # Escribir bits comprimidos
-        encoded_bits.tofile(f)
+        f.write(packed)
 
-    # Calcular estadísticas
-    original_size = os.path.getsize(input_filename)
-    compressed_size = os.path.getsize(output_filename)
+    # Calcular estadísticas (los tamaños ya se conocen, sin volver a consultar el disco)
+    compressed_size = len(header_bytes) + len(packed)
     compression_factor = compressed_size / original_size
     avg_bits = calculate_average_bits(codes_dic, freq_dict, len(text))
 
@@ -249,90 +462,229 @@ def encode_file(input_filename, output_filename=None):
         'freq_dict': freq_dict
     }
 
-    print(f"\nArchivo comprimido: {output_filename}")
-    print(f"  Tamaño original: {original_size} bytes")
-    print(f"  Tamaño comprimido: {compressed_size} bytes")
-    print(f"  Factor de compresión: {compression_factor:.4f}")
-    print(f"  Bits promedio por símbolo: {avg_bits:.4f}")
+    if verbose:
+        print_compression_stats(output_filename, stats)
 
     return stats
 
+def pack_header(codes_dic, padding, total_chars):
+    """Serializa el header canónico del .huff.
+
+    Formato (little endian): HUFF_MAGIC, versión (B), total_chars (I),
+    padding (B), max_len (B),
+    número de códigos de cada longitud 1..max_len (I cada uno), tamaño
+    en bytes de los símbolos (I) y los símbolos en orden canónico (UTF-8).
+    """
+    max_len = max(length for _, length in codes_dic.values())
+    count = [0] * (max_len + 1)
+    for _, length in codes_dic.values():
+        count[length] += 1
+    symbols = ''.join(sorted(codes_dic, key=lambda c: (codes_dic[c][1], c)))
+    symbols = symbols.encode('utf-8')
+    return (HUFF_MAGIC + struct.pack('<B', HUFF_VERSION) +
+            struct.pack('<IBB', total_chars, padding, max_len) +
+            struct.pack(f'<{max_len}I', *count[1:]) +
+            struct.pack('<I', len(symbols)) + symbols)
+
+
+def read_header(f):
+    """Lee el header canónico y reconstruye códigos y tablas.
+
+    Lanza ValueError si el archivo no es un .huff de este formato.
+    """
+    prefix = f.read(len(HUFF_MAGIC) + 1)
+    if prefix[:len(HUFF_MAGIC)] != HUFF_MAGIC:
+        raise ValueError("no es un archivo .huff con header canónico "
+                         "(¿formato antiguo con pickle?)")
+    if prefix[len(HUFF_MAGIC):] != bytes([HUFF_VERSION]):
+        raise ValueError(f"versión de .huff no soportada: {prefix[len(HUFF_MAGIC):]!r}")
+    try:
+        total_chars, padding, max_len = struct.unpack('<IBB', f.read(6))
+        count = struct.unpack(f'<{max_len}I', f.read(4 * max_len))
+        symbols_size, = struct.unpack('<I', f.read(4))
+        symbols = f.read(symbols_size).decode('utf-8')
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"header .huff corrupto: {e}") from e
+    if max_len == 0 or len(symbols) != sum(count):
+        raise ValueError("header .huff corrupto: tabla de longitudes inválida")
+
+    lengths = {}
+    index = 0
+    for length, n in enumerate(count, start=1):
+        for char in symbols[index:index + n]:
+            lengths[char] = length
+        index += n
+
+    codes_dic = build_canonical_codes(lengths)
+    return {
+        'codes_dic': codes_dic,
+        'padding': padding,
+        'total_chars': total_chars,
+        'canonical': build_canonical_tables(codes_dic)
+    }
+
+
 def read_huff_file(input_filename):
-    #Lee el header y los bits desde el .huff
+    #Lee el header y los bytes comprimidos desde el .huff
     with open(input_filename, 'rb') as f:
-        header = pickle.load(f)
-        bits = bitarray()
-        bits.fromfile(f)
-    return header, bits
+        header = read_header(f)
+        payload = f.read()
+    return header, payload
+
+def _decode_inverse_buffer(header, payload):
+    #Decodifica en memoria usando la tabla de códigos; devuelve los bytes UTF-8
+    # El número de caracteres del header marca el final: el relleno no se lee
+    tables = header['canonical']
+
+    return decode_lut(payload, header['total_chars'], build_decode_lut(tables), tables)
 
 def decode_file_inverse(input_filename, output_filename=None):
-    #Decodifica usando diccionario inverso
+    #Decodifica con la tabla rápida (LUT) y Moffat–Turpin para los códigos largos
     if output_filename is None:
         output_filename = input_filename.replace('.huff', '.dec.txt')
 
-    header, bits = read_huff_file(input_filename)
-    if header is None:
+    try:
+        header, payload = read_huff_file(input_filename)
+    except ValueError as e:
+        print(f"Error al leer {input_filename}: {e}")
         return False
 
-    codes_dic = header.get('codes_dic', {})
+    out = _decode_inverse_buffer(header, payload)
+    with open(output_filename, 'wb') as f:
+        f.write(out)
+    return True
+
+def decode_lut(data, total_chars, lut, tables, lut_bits=LUT_BITS):
+    """Decodifica con la tabla rápida y recurre a Moffat–Turpin si no basta."""
+    max_len = tables['max_len']
+    sentinel = tables['sentinel']
+    sym_bytes = tables['sym_bytes']
+    base = [tables['offset'][length] - tables['first_code'][length]
+            for length in range(max_len + 1)]
+    lut_mask = (1 << lut_bits) - 1
+    mask = (1 << max_len) - 1
+    width = max(lut_bits, max_len)
+
+    out = bytearray()
+    window = 0
+    nbits = 0
+    pos = 0
+    for _ in range(total_chars):
+        # Rellenar la ventana con 8 bytes de golpe (al final, completar con ceros)
+        while nbits < width:
+            chunk = data[pos:pos + 8]
+            window = ((window & ((1 << nbits) - 1)) << 64) | \
+                (int.from_bytes(chunk, 'big') << (64 - 8 * len(chunk)))
+            pos += 8
+            nbits += 64
+        char, length = lut[(window >> (nbits - lut_bits)) & lut_mask]
+        if not length:
+            # Código más largo que lut_bits
+            w = (window >> (nbits - max_len)) & mask
+            length = lut_bits + 1
+            while w >= sentinel[length]:
+                length += 1
+            char = sym_bytes[(w >> (max_len - length)) + base[length]]
+        out += char
+        nbits -= length
+    return out
+
+def build_code_trie(tables):
+    """Árbol de los códigos en arreglos: child[2*n + bit] y leaf[n] (bytes UTF-8)."""
+    sym_bytes = tables['sym_bytes']
+    child = [-1, -1]
+    leaf = [None]
+    for index, code, length in canonical_entries(tables):
+        node = 0
+        for shift in range(length - 1, -1, -1):
+            k = 2 * node + ((code >> shift) & 1)
+            if child[k] < 0:
+                child[k] = len(leaf)
+                child += [-1, -1]
+                leaf.append(None)
+            node = child[k]
+        leaf[node] = sym_bytes[index]
+    return child, leaf
+
+
+def fsm_step(child, leaf, state, byte, nbits=8):
+    """Recorre los nbits más altos de byte desde state.
+
+    Devuelve el estado (nodo interno) final y los bytes UTF-8 de los
+    caracteres que se completaron por el camino.
+    """
+    out = b''
+    node = state
+    for shift in range(7, 7 - nbits, -1):
+        node = child[2 * node + ((byte >> shift) & 1)]
+        if leaf[node] is not None:
+            out += leaf[node]
+            node = 0
+    return node, out
+
+
+def decode_fsm(data, end_bit, child, leaf):
+    """Decodifica byte a byte con una máquina de estados sobre el árbol.
+
+    La tabla state_table[(state << 8) | byte] = (siguiente estado, bytes
+    producidos) es un diccionario que se llena bajo demanda: solo ocupa
+    memoria para las combinaciones que el texto visita realmente, y deja
+    de crecer al llegar a FSM_CACHE_LIMIT (alfabetos muy grandes).
+    """
+    state_table = {}
+    full_bytes, tail_bits = divmod(end_bit, 8)
+
+    out = bytearray()
+    state = 0
+    for byte in memoryview(data)[:full_bytes]:
+        key = (state << 8) | byte
+        entry = state_table.get(key)
+        if entry is None:
+            entry = fsm_step(child, leaf, state, byte)
+            if len(state_table) < FSM_CACHE_LIMIT:
+                state_table[key] = entry
+        state, produced = entry
+        out += produced
+    # Último byte: solo los bits que no son relleno
+    if tail_bits:
+        state, produced = fsm_step(child, leaf, state, data[full_bytes], tail_bits)
+        out += produced
+    return out
+
+def _decode_tree_buffer(header, payload):
+    """Decodifica en memoria con la máquina de estados; None si faltan las tablas canónicas"""
+    tables = header.get('canonical', None)
     padding = header.get('padding', 0)
 
-    if padding:
-        bits = bits[:len(bits) - padding]
-
-    # construir diccionario inverso
-    inv = {v: k for k, v in codes_dic.items()}
-
-    out_chars = []
-    cur = ""
-    for b in bits:
-        cur += '1' if b else '0'
-        if cur in inv:
-            out_chars.append(inv[cur])
-            cur = ""
-    with open(output_filename, 'w', encoding='utf-8') as f:
-        f.write(''.join(out_chars))
-    return True
+    if tables is None:
+        print("Error: header no contiene tablas canónicas")
+        return None
+
+    # Se decodifica hasta end_bit en lugar de recortar (copiar) los bits
+    end_bit = len(payload) * 8 - padding
+    child, leaf = build_code_trie(tables)
+    return decode_fsm(payload, end_bit, child, leaf)
 
 def decode_file_tree(input_filename, output_filename=None):
-    """Decodifica bit a bit usando el árbol Huffman"""
+    """Decodifica byte a byte recorriendo el árbol como máquina de estados"""
     if output_filename is None:
         output_filename = input_filename.replace('.huff', '.dec.txt')
 
-    header, bits = read_huff_file(input_filename)
-    if header is None:
+    try:
+        header, payload = read_huff_file(input_filename)
+    except ValueError as e:
+        print(f"Error al leer {input_filename}: {e}")
         return False
 
-    root = header.get('tree', None)
-    padding = header.get('padding', 0)
-
-    if root is None:
-        print("Error: header no contiene árbol")
+    out = _decode_tree_buffer(header, payload)
+    if out is None:
         return False
 
-    if padding:
-        bits = bits[:len(bits) - padding]
-
-    # caso especial: arbol con un solo carácter
-    if root.left is None and root.right is None:
-        single_char = root.char
-        count = len(bits)
-        with open(output_filename, 'w', encoding='utf-8') as f:
-            f.write(single_char * count)
-        return True
-
-    out_chars = []
-    node = root
-    for b in bits:
-        node = node.right if b else node.left
-        if node.left is None and node.right is None:
-            out_chars.append(node.char)
-            node = root
-
-    with open(output_filename, 'w', encoding='utf-8') as f:
-        f.write(''.join(out_chars))
+    with open(output_filename, 'wb') as f:
+        f.write(out)
     return True
 
+@functools.lru_cache(maxsize=None)
 def find_txt_files(base_dir="../libros"):
     """
       - ../libros/es/*.txt, ../libros/fr/*.txt, ../libros/en/*.txt
@@ -340,20 +692,24 @@ def find_txt_files(base_dir="../libros"):
     files = []
     best_langs = ['es','fr','en']
     # buscar subcarpetas
-    found_any = False
     for lang in best_langs:
-        pattern = os.path.join(base_dir, lang, '*.txt')
-        matched = glob.glob(pattern)
-        if matched:
-            found_any = True
-            for p in matched:
-                files.append((p, lang))
-    if found_any:
-        return files
-    return files
+        lang_dir = os.path.join(base_dir, lang)
+        if not os.path.isdir(lang_dir):
+            continue
+        with os.scandir(lang_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith('.txt'):
+                    files.append((entry.path, lang))
+    # tupla: el resultado se memoiza y no debe poder modificarse
+    return tuple(files)
+
+def _encode_worker(job):
+    # Cada archivo es independiente: se comprime en su propio proceso
+    path, outname = job
+    return encode_file(path, outname, verbose=False)
 
 def compress_many(file_list, out_dir=None):
-    results = []
+    jobs = []
     for path, language in file_list:
         base = os.path.basename(path)
         if out_dir:
@@ -361,8 +717,16 @@ def compress_many(file_list, out_dir=None):
             outname = os.path.join(out_dir, base + '.huff')
         else:
             outname = path + '.huff'
-        stats = encode_file(path, outname)
+        jobs.append((path, outname))
+
+    with ProcessPoolExecutor() as ex:
+        all_stats = list(ex.map(_encode_worker, jobs))
+
+    results = []
+    for (path, language), (_, outname), stats in zip(file_list, jobs, all_stats):
+        base = os.path.basename(path)
         if stats:
+            print_compression_stats(outname, stats)
             results.append({
                 'filename': base,
                 'language': language,
@@ -371,6 +735,9 @@ def compress_many(file_list, out_dir=None):
                 'compression_factor': stats['compression_factor'],
                 'avg_bits_per_symbol': stats['avg_bits_per_symbol'],
                 'huff_path': outname,
+                # Tablas para reconstruir el árbol bajo demanda (no van al CSV)
+                'codes_dic': stats['codes_dic'],
+                'freq_dict': stats['freq_dict'],
             })
     return results
 
@@ -379,7 +746,7 @@ def save_csv_stats(rows, csv_path):
         print("No hay filas")
         return
     keys = list(rows[0].keys())
-    keys = [k for k in keys if k != 'tree_root']
+    keys = [k for k in keys if k not in ('codes_dic', 'freq_dict')]
     with open(csv_path, 'w', newline='', encoding='utf-8') as f:
         writer = csv.DictWriter(f, fieldnames=keys)
         writer.writeheader()
@@ -405,19 +772,16 @@ def summarize_by_language(rows):
     return summary
 
 def measure_decoder(decoder_func, input_huff, runs=500):
+    # Se lee el .huff una sola vez; solo se mide la decodificación en memoria
+    header, payload = read_huff_file(input_huff)
     times = []
-    tmp_out = input_huff.replace('.huff', '.tmp.dec.txt')
     for _ in range(runs):
         t0 = time.perf_counter()
-        ok = decoder_func(input_huff, tmp_out)
+        out = decoder_func(header, payload)
         t1 = time.perf_counter()
-        if not ok:
+        if out is None:
             raise RuntimeError("Error en decodificador durante la medición")
         times.append(t1 - t0)
-    try:
-        os.remove(tmp_out)
-    except Exception:
-        pass
     mean = statistics.mean(times)
     stdev = statistics.stdev(times) if len(times) > 1 else 0.0
     return mean, stdev
@@ -448,14 +812,10 @@ def main():
         if lang not in examples:
             examples[lang] = r
     for lang, row in examples.items():
-        tree_root = row.get('tree_root')
-        if tree_root is None:
-            huff_path = row.get('huff_path')
-            header, _ = read_huff_file(huff_path)
-            tree_root = header.get('tree') if header else None
-        if tree_root:
-            safe_name = f"tree_{lang}"
-            visualize_huffman_tree(tree_root, output_file=safe_name)
+        # Solo se reconstruye el árbol de los ejemplos que se dibujan
+        tree_root = build_tree_from_codes(row['codes_dic'], row['freq_dict'])
+        safe_name = f"tree_{lang}"
+        visualize_huffman_tree(tree_root, output_file=safe_name)
 
     #Medir y sacar promedio
     timing_rows = []
@@ -465,8 +825,8 @@ def main():
         if not huff:
             continue
         try:
-            m_inv, s_inv = measure_decoder(decode_file_inverse, huff, runs)
-            m_tree, s_tree = measure_decoder(decode_file_tree, huff, runs)
+            m_inv, s_inv = measure_decoder(_decode_inverse_buffer, huff, runs)
+            m_tree, s_tree = measure_decoder(_decode_tree_buffer, huff, runs)
             timing_rows.append({
                 'language': lang,
                 'huff_file': os.path.basename(huff),
@@ -497,4 +857,5 @@ def main():
                 writer.writerow(r)
 
 
-main()
+if __name__ == "__main__":
+    main()